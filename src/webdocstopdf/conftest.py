@@ -0,0 +1,79 @@
+import base64
+import time
+from collections import deque
+
+import pytest
+
+# Base64 encoded PDF, as returned by the WebDriver print command.
+ENCODED_DUMMY_PDF = base64.b64encode(b"dummy_pdf").decode("utf-8")
+
+
+# Dummy driver for simulating Selenium.
+class DummyDriver:
+    __test__ = False
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        # Bounded, so that stress tests do not keep every call around.
+        self.executed_scripts = deque(maxlen=1024)
+        self.script_args = deque(maxlen=1024)
+        self.execute_script_return = None
+        self.visited_urls = deque(maxlen=1024)
+        self._print_page_return = None
+        self.find_elements_return = []
+        self.find_element_return = None
+        self.raise_exception_in_find = False
+
+    @property
+    def _all_scripts_joined(self):
+        # Joined on demand from the bounded history, so it cannot grow without limit either.
+        return "\n".join(self.executed_scripts)
+
+    def execute_script(self, script, *args):
+        self.executed_scripts.append(script)
+        self.script_args.append(args)
+        if "document.readyState" in script:
+            return True
+        return self.execute_script_return
+
+    def get(self, url):
+        self.visited_urls.append(url)
+
+    def print_page(self, pdf_params):
+        # Return a base64 encoded dummy PDF content.
+        if self._print_page_return is not None:
+            return self._print_page_return
+        return ENCODED_DUMMY_PDF
+
+    def find_elements(self, by, selector):
+        return self.find_elements_return
+
+    def find_element(self, by, selector):
+        if self.raise_exception_in_find:
+            raise Exception("Not found")
+        return self.find_element_return
+
+    def quit(self):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def _no_sleep(monkeypatch):
+    monkeypatch.setattr(time, "sleep", lambda _x: None)
+
+
+@pytest.fixture
+def dummy_driver():
+    return DummyDriver()
+
+
+@pytest.fixture(scope="session")
+def encoded_dummy_pdf():
+    return ENCODED_DUMMY_PDF
+
+
+@pytest.fixture(scope="session")
+def output_dir(tmp_path_factory):
+    return tmp_path_factory.mktemp("pdfs")
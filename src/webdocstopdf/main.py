@@ -1,32 +1,376 @@
 """
 CLI tool to export online documentation to a merged PDF.
 
-Each page (cover, index, and documentation pages) is exported to PDF in memory
-using Selenium's print_page method. The PDFs are then merged using pdfminer to
-extract text and ReportLab to reassemble a new PDF (one page per extracted PDF).
-Note: This merging approach extracts text and reassembles the PDF, losing the
-original layout, images, and styling.
+Each documentation page is printed to PDF by a headless browser, through the
+DevTools protocol where the driver supports it and Selenium's print_page otherwise,
+optionally by several browsers in parallel. The cover and index are generated
+with ReportLab (or printed by the browser). Every PDF is written to a temporary
+file, and the files are then merged with pikepdf, keeping the original layout,
+images and styling.
 """
 import argparse
+import atexit
+import functools
+import multiprocessing
+import multiprocessing.util
 import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
 import time
-from PyPDF2 import PdfMerger
+import pikepdf
 import base64
+import json
 import urllib.parse
+import urllib.request
 from collections import OrderedDict
 from io import BytesIO
+from xml.sax.saxutils import escape
 from tqdm import tqdm
 from datetime import datetime
 import yaml
+import platformdirs
 import re
 import fnmatch
+from concurrent.futures import Future, ProcessPoolExecutor
 
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import cm
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFError, TTFont
+from reportlab.platypus import ListFlowable, ListItem, Paragraph, SimpleDocTemplate, Spacer
 from selenium import webdriver
+from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.common.print_page_options import PrintOptions
+from selenium.webdriver.support.ui import WebDriverWait
 
+# Prefer the libyaml based loader, falling back to the pure Python one if PyYAML was built without it.
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
 
-def setup_driver(browser: str = None):
-    """Get a Selenium WebDriver instance for the specified browser."""
+
+# Resources that don't contribute to a printed text document but slow down every page load.
+BLOCKED_URLS = [
+    "*.woff", "*.woff2", "*.ttf",
+    "*googletagmanager*", "*google-analytics*", "*giscus*", "*disqus*",
+]
+BLOCKED_IMAGE_URLS = ["*.png", "*.jpg", "*.jpeg", "*.gif", "*.svg"]
+
+
+def block_resources(driver, allow_images: bool = False) -> None:
+    """Use the DevTools protocol to stop the browser from fetching fonts, trackers and, optionally, images."""
+    blocked_urls = BLOCKED_URLS if allow_images else BLOCKED_URLS + BLOCKED_IMAGE_URLS
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": blocked_urls})
+
+
+# Browser profiles live here between runs, so their HTTP caches can be reused.
+CACHE_DIR = platformdirs.user_cache_dir("webdocstopdf")
+CHROME_DISK_CACHE_SIZE = 256 * 1024 * 1024
+
+# Kept browsers listen on consecutive ports, one per slot (the main driver uses slot 0
+# and every pool worker gets its own).
+KEPT_BROWSER_PORT = 9222
+
+
+# Lock files of the profiles this process is using. They are held until it exits.
+_profile_locks = []
+
+
+def lock_profile(profile_dir: str) -> bool:
+    """
+    Claim a browser profile (or kept browser) for the rest of this process's life.
+
+    Returns False if another process (e.g. a concurrent run) is already using it,
+    as Chrome refuses to start with a profile that is open elsewhere. The lock is
+    released by the OS when the process ends, even if it crashes.
+    """
+    os.makedirs(os.path.dirname(profile_dir), exist_ok=True)
+    lock_file = open(f"{profile_dir}.lock", "a+b")
+    try:
+        if sys.platform == "win32":
+            import msvcrt
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return False
+    _profile_locks.append(lock_file)
+    return True
+
+
+def is_port_open(port: int) -> bool:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.settimeout(0.5)
+        return sock.connect_ex(("127.0.0.1", port)) == 0
+
+
+# How long a run's claim on its kept browser lasts. Runs renew it while they use the browser,
+# so the browser of a run that crashed is shut down this long after the last renewal.
+KEPT_BROWSER_LEASE = 60
+
+
+def extend_kept_browser_lease(browser_dir: str, seconds: float) -> None:
+    """Keep the kept browser running for at least the given number of seconds from now."""
+    expires = max(time.time() + seconds, read_kept_browser_lease(browser_dir))
+    fd, temp_path = tempfile.mkstemp(dir=browser_dir, prefix="lease.")
+    with os.fdopen(fd, "w") as f:
+        f.write(str(expires))
+    # Replaced in one step, so the reaper never reads a half-written lease.
+    os.replace(temp_path, os.path.join(browser_dir, "lease"))
+
+
+def read_kept_browser_lease(browser_dir: str) -> float:
+    """Return the time until which the kept browser is claimed, 0 if it isn't."""
+    try:
+        with open(os.path.join(browser_dir, "lease")) as f:
+            return float(f.read())
+    except (OSError, ValueError):
+        return 0.0
+
+
+def read_kept_browser_info(browser_dir: str) -> dict:
+    """Return what was recorded about the kept browser when it was launched."""
+    try:
+        with open(os.path.join(browser_dir, "browser.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def get_browser_version(port: int) -> dict:
+    """Return the DevTools /json/version info of the browser listening on the port, {} if there's none."""
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/json/version", timeout=2) as response:
+            return json.load(response)
+    except (OSError, ValueError):
+        return {}
+
+
+def find_kept_browser(browser_dir: str, port: int):
+    """
+    Return the DevTools WebSocket URL of the kept browser if it's the one listening on the port, else None.
+
+    Every browser gets a WebSocket URL of its own, which tells the browser launched into
+    browser_dir apart from any other program that may be using the port since.
+    """
+    ws_url = get_browser_version(port).get("webSocketDebuggerUrl")
+    if ws_url is not None and ws_url == read_kept_browser_info(browser_dir).get("webSocketDebuggerUrl"):
+        return ws_url
+    return None
+
+
+def close_kept_browser(ws_url: str) -> None:
+    """
+    Ask a browser to close through its DevTools WebSocket.
+
+    No Origin header is sent, as Chrome refuses WebSocket connections from origins it
+    wasn't started with --remote-allow-origins for.
+    """
+    import websocket
+
+    try:
+        connection = websocket.create_connection(ws_url, timeout=5, suppress_origin=True)
+    except (OSError, websocket.WebSocketException) as e:
+        raise RuntimeError(f"Couldn't connect to the kept browser at {ws_url}: {e}") from e
+    try:
+        connection.send(json.dumps({"id": 1, "method": "Browser.close"}))
+        connection.recv()
+    except websocket.WebSocketConnectionClosedException:
+        # The browser may go away before it answers.
+        pass
+    finally:
+        connection.close()
+
+
+def shutdown_idle_browser(browser_dir: str, port: int) -> None:
+    """
+    Wait until the lease on the kept browser expires and shut the browser down.
+
+    Runs renew the lease while they use the browser and extend it by the idle timeout
+    when they're done, so this waits for as long as any of them needs it. This is run
+    in a detached process, so it outlives the run that scheduled it.
+    """
+    while True:
+        remaining = read_kept_browser_lease(browser_dir) - time.time()
+        if remaining <= 0:
+            break
+        time.sleep(remaining)
+    ws_url = find_kept_browser(browser_dir, port)
+    if ws_url is not None:
+        close_kept_browser(ws_url)
+
+
+def _detached_process_kwargs() -> dict:
+    if sys.platform == "win32":
+        return {"creationflags": subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP}
+    return {"start_new_session": True}
+
+
+def _spawn_reaper(browser_dir: str, port: int) -> None:
+    reaper = (
+        "from webdocstopdf.main import shutdown_idle_browser; "
+        f"shutdown_idle_browser({browser_dir!r}, {port})"
+    )
+    subprocess.Popen(
+        [sys.executable, "-c", reaper],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, **_detached_process_kwargs()
+    )
+
+
+def wait_for_port(port: int, opened: bool, timeout: float = 10) -> None:
+    """Wait until the port is open, or closed if opened is False."""
+    deadline = time.monotonic() + timeout
+    while is_port_open(port) != opened:
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"The browser didn't {'open' if opened else 'close'} its debugging port {port} in time.")
+        time.sleep(0.1)
+
+
+def find_chrome_executable() -> str:
+    """Return the path of the installed Chrome (or Chromium) binary."""
+    if sys.platform == "win32":
+        candidates = [
+            os.path.join(os.environ[variable], "Google", "Chrome", "Application", "chrome.exe")
+            for variable in ("PROGRAMFILES", "PROGRAMFILES(X86)", "LOCALAPPDATA")
+            if variable in os.environ
+        ]
+    else:
+        candidates = [
+            shutil.which(name)
+            for name in ("google-chrome", "google-chrome-stable", "chromium", "chromium-browser", "chrome")
+        ]
+        if sys.platform == "darwin":
+            candidates += [
+                "/Applications/Google Chrome.app/Contents/MacOS/Google Chrome",
+                "/Applications/Chromium.app/Contents/MacOS/Chromium",
+            ]
+    for candidate in candidates:
+        if candidate and os.path.isfile(candidate) and os.access(candidate, os.X_OK):
+            return candidate
+    raise RuntimeError("Chrome wasn't found. Install Google Chrome or Chromium to keep the browser running.")
+
+
+def launch_kept_browser(arguments: list[str], browser_dir: str, port: int, timeout: float = 10) -> None:
+    """Start a Chrome process that keeps running after this program exits."""
+    command = [
+        find_chrome_executable(),
+        f"--remote-debugging-port={port}",
+        "--user-data-dir={}".format(os.path.join(browser_dir, "profile")),
+        "--no-first-run",
+        "--no-default-browser-check",
+        *arguments,
+    ]
+    subprocess.Popen(
+        command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, **_detached_process_kwargs()
+    )
+    wait_for_port(port, opened=True, timeout=timeout)
+    # Remember the options the browser was started with, and how to recognize it later on.
+    info = {"arguments": arguments, "webSocketDebuggerUrl": get_browser_version(port).get("webSocketDebuggerUrl")}
+    with open(os.path.join(browser_dir, "browser.json"), "w") as f:
+        json.dump(info, f)
+
+
+class KeptChrome(webdriver.Chrome):
+    """
+    Chrome driver attached to a browser that outlives the session.
+
+    While the session is open, the lease on the browser is renewed in the background.
+    Quitting only ends the WebDriver session and extends the lease by idle_timeout
+    seconds. The browser is left running for the next run, and shut down by a detached
+    process once the lease expires.
+    """
+
+    def __init__(self, browser_dir: str, port: int, idle_timeout: float, **kwargs):
+        super().__init__(**kwargs)
+        self.browser_dir = browser_dir
+        self.port = port
+        self.idle_timeout = idle_timeout
+        self._released = threading.Event()
+        threading.Thread(target=self._renew_lease, daemon=True).start()
+
+    def _renew_lease(self):
+        while not self._released.wait(KEPT_BROWSER_LEASE / 3):
+            extend_kept_browser_lease(self.browser_dir, KEPT_BROWSER_LEASE)
+
+    def quit(self):
+        if self._released.is_set():
+            return
+        self._released.set()
+        super().quit()
+        extend_kept_browser_lease(self.browser_dir, self.idle_timeout)
+
+
+def attach_kept_browser(arguments: list[str], slot: int = 0, idle_timeout: float = 600):
+    """
+    Connect to the kept browser for the given slot, starting it first if it isn't running.
+
+    A browser started with other arguments (e.g. without --allow-images) is restarted.
+    """
+    from selenium.webdriver.chrome.options import Options as ChromeOptions
+
+    browser_dir = os.path.join(CACHE_DIR, f"browser-{slot}")
+    port = KEPT_BROWSER_PORT + slot
+    os.makedirs(browser_dir, exist_ok=True)
+    # Claim the browser first, so a pending shutdown leaves it running.
+    extend_kept_browser_lease(browser_dir, KEPT_BROWSER_LEASE)
+    if is_port_open(port):
+        ws_url = find_kept_browser(browser_dir, port)
+        if ws_url is None:
+            raise RuntimeError(f"Port {port} is used by another program, so the browser can't be kept.")
+        if read_kept_browser_info(browser_dir).get("arguments") != arguments:
+            print("The kept browser was started with other options, restarting it.")
+            close_kept_browser(ws_url)
+            wait_for_port(port, opened=False)
+    if not is_port_open(port):
+        launch_kept_browser(arguments, browser_dir, port)
+    # Shuts the browser down once the lease expires, also if this run ends without quitting.
+    _spawn_reaper(browser_dir, port)
+
+    options = ChromeOptions()
+    options.debugger_address = f"127.0.0.1:{port}"
+    driver = KeptChrome(browser_dir, port, idle_timeout, options=options)
+    atexit.register(driver.quit)
+    return driver
+
+
+def patch_undetected_chromedriver() -> str:
+    """
+    Download and patch the chromedriver binary used by undetected_chromedriver, and return its path.
+
+    Unless it's given a binary, every uc.Chrome unlinks, downloads and patches the same file
+    on start-up, so browsers started at the same time break each other's driver. Patching it
+    once up front and passing the path on avoids that.
+    """
+    import undetected_chromedriver as uc
+
+    patcher = uc.Patcher()
+    patcher.auto()
+    return patcher.executable_path
+
+
+def setup_driver(browser: str = None, allow_images: bool = False, keep_browser: bool = False,
+                 slot: int = 0, idle_timeout: float = 600, stealth: bool = False,
+                 driver_executable_path: str = None):
+    """
+    Get a Selenium WebDriver instance for the specified browser.
+
+    Chrome runs headless by default. With stealth, it's started visibly through
+    undetected_chromedriver and patched with selenium-stealth instead, for sites that
+    block automated browsers. driver_executable_path is the chromedriver binary it uses,
+    as returned by patch_undetected_chromedriver. With keep_browser, Chrome is started once
+    and reused by later runs instead of being launched from scratch every time. Each slot
+    gets its own browser, used by one run at a time.
+    """
     if browser is None:
         browser = "chrome"
 
@@ -34,35 +378,68 @@ def setup_driver(browser: str = None):
         from selenium.webdriver.edge.options import Options as EdgeOptions
         options = EdgeOptions()
         options.add_argument("--headless=new")
+        if not allow_images:
+            options.add_argument("--blink-settings=imagesEnabled=false")
         driver = webdriver.Edge(options=options)
+        block_resources(driver, allow_images)
         return driver
     elif browser == "chrome":
-        from selenium.webdriver.chrome.options import Options as ChromeOptions
-        import undetected_chromedriver as uc
-        from selenium_stealth import stealth
-
         user_agent = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/134.0.6998.35 Safari/537.36"
-        chrome_options = uc.ChromeOptions()
-        #chrome_options.add_argument('--headless=new')
-        chrome_options.add_argument("--start-maximized")
-        chrome_options.add_argument("user-agent={}".format(user_agent))
-        driver = uc.Chrome(options=chrome_options)
-        stealth(driver,
-                languages=["en-US", "en"],
-                vendor="Google Inc.",
-                platform="Win32",
-                webgl_vendor="Intel Inc.",
-                renderer="Intel Iris OpenGL Engine",
-                fix_hairline=True
-                )
+        arguments = [
+            "--start-maximized",
+            "--user-agent={}".format(user_agent),
+            f"--disk-cache-size={CHROME_DISK_CACHE_SIZE}",
+        ]
+        if not stealth:
+            arguments.append("--headless=new")
+        if not allow_images:
+            arguments.append("--blink-settings=imagesEnabled=false")
+        # Only one run at a time drives a kept browser. While another run is using it,
+        # this one starts a browser of its own.
+        if keep_browser and not lock_profile(os.path.join(CACHE_DIR, f"browser-{slot}")):
+            keep_browser = False
+        # A persistent profile per slot keeps the HTTP cache of the previous runs. If a
+        # concurrent run is using it, the browser gets a throwaway profile instead.
+        profile_dir = os.path.join(CACHE_DIR, f"profile-{slot}")
+        if not keep_browser and not lock_profile(profile_dir):
+            profile_dir = None
+        if keep_browser:
+            driver = attach_kept_browser(arguments, slot, idle_timeout)
+        elif stealth:
+            import undetected_chromedriver as uc
+            chrome_options = uc.ChromeOptions()
+            for argument in arguments:
+                chrome_options.add_argument(argument)
+            # user_multi_procs stops undetected_chromedriver from replacing a driver binary
+            # other browsers (other pool workers or runs) may be using.
+            driver = uc.Chrome(options=chrome_options, user_data_dir=profile_dir,
+                               driver_executable_path=driver_executable_path, user_multi_procs=True)
+        else:
+            from selenium.webdriver.chrome.options import Options as ChromeOptions
+            chrome_options = ChromeOptions()
+            for argument in arguments:
+                chrome_options.add_argument(argument)
+            if profile_dir is not None:
+                chrome_options.add_argument(f"--user-data-dir={profile_dir}")
+            driver = webdriver.Chrome(options=chrome_options)
+        if stealth:
+            import selenium_stealth
+            selenium_stealth.stealth(driver,
+                                     languages=["en-US", "en"],
+                                     vendor="Google Inc.",
+                                     platform="Win32",
+                                     webgl_vendor="Intel Inc.",
+                                     renderer="Intel Iris OpenGL Engine",
+                                     fix_hairline=True
+                                     )
+        block_resources(driver, allow_images)
         return driver
     else:
         raise ValueError("Unsupported browser. Supported browsers: 'edge', 'chrome'")
 
 
-def apply_custom_css(driver):
-    """Injects custom styles better suited for printing."""
-    css_rules = """
+# Scripts run on every documentation page. They are built once, at import time.
+_CUSTOM_CSS_RULES = """
     @media print {
         @page {
             size: A4 portrait;
@@ -87,20 +464,14 @@ def apply_custom_css(driver):
         }       
     }
     """
-    script = f"""
+
+_CUSTOM_CSS_SCRIPT = f"""
     var style = document.createElement('style');
-    style.innerHTML = `{css_rules}`;
+    style.innerHTML = `{_CUSTOM_CSS_RULES}`;
     document.head.appendChild(style);
     """
-    driver.execute_script(script)
-
 
-def expand_collapsible(driver) -> None:
-    """
-    Expands collapsible sections on the page if their first three words 
-    do not contain the keyword 'reference'.
-    """
-    expand_script = r"""
+_EXPAND_COLLAPSIBLE_SCRIPT = r"""
     document.querySelectorAll('details').forEach(function(el) {
         const textContent = el.textContent.trim().split(/\s+/).slice(0, 3).join(' ').toLowerCase();
         if (!textContent.includes('reference')) {
@@ -108,28 +479,59 @@ def expand_collapsible(driver) -> None:
         }
     });
     """
-    driver.execute_script(expand_script)
+
+_PREFETCH_SCRIPT = """
+    var url = arguments[0];
+    ['dns-prefetch', 'preconnect', 'prefetch'].forEach(function(rel) {
+        var link = document.createElement('link');
+        link.rel = rel;
+        link.href = url;
+        document.head.appendChild(link);
+    });
+    """
+
+# Everything print_url_to_pdf does to a loaded page, in a single WebDriver call.
+_PREPARE_PAGE_SCRIPT = (
+    _EXPAND_COLLAPSIBLE_SCRIPT
+    + _CUSTOM_CSS_SCRIPT
+    + "if (arguments[0]) {" + _PREFETCH_SCRIPT + "}"
+)
+
+
+def apply_custom_css(driver):
+    """Injects custom styles better suited for printing."""
+    driver.execute_script(_CUSTOM_CSS_SCRIPT)
+
+
+def expand_collapsible(driver) -> None:
+    """
+    Expands collapsible sections on the page if their first three words 
+    do not contain the keyword 'reference'.
+    """
+    driver.execute_script(_EXPAND_COLLAPSIBLE_SCRIPT)
 
 
 def read_links_from_file(file_path: str, selector=None) -> list[tuple[str, str]]:
     """Reads links from a YAML file."""
 
-    def list_to_pair(data):
-        return [("", item) for item in data]
+    def list_to_pair(items):
+        # Takes any iterable, so the values can be streamed in without an intermediate list.
+        return [("", item) for item in items]
 
     if os.path.isfile(file_path):
         try:
             with open(file_path, 'r', encoding='utf-8') as yaml_file:
-                data = yaml.safe_load(yaml_file)
+                data = yaml.load(yaml_file, Loader=SafeLoader)
                 if isinstance(data, list):
                     return list_to_pair(data)
                 elif isinstance(data, dict):
                     if selector is None:
-                        return list_to_pair([item for sublist in data.values() for item in sublist])
+                        return list_to_pair(item for sublist in data.values() for item in sublist)
                     elif selector:
-                        matching_keys = [key for key in data.keys() if fnmatch.fnmatch(key, selector)]
-                        merged_values = [item for key in matching_keys for item in data[key]]
-                        return list_to_pair(merged_values)
+                        # Same matching as fnmatch.fnmatch, with the pattern translated only once.
+                        pattern = re.compile(fnmatch.translate(os.path.normcase(selector)))
+                        matching_keys = (key for key in data.keys() if pattern.match(os.path.normcase(key)))
+                        return list_to_pair(item for key in matching_keys for item in data[key])
                 raise ValueError("Invalid YAML structure: Expected list or dict of lists.")
         except Exception as e:
             raise ValueError(f"Error loading YAML file '{file_path}': {e}")
@@ -137,7 +539,7 @@ def read_links_from_file(file_path: str, selector=None) -> list[tuple[str, str]]
         raise ValueError(f"The input parameter appears to be a YAML file, but the file does not exist.")
 
 
-def get_doc_page_urls(driver, input_path: str, selector: None) -> list[tuple[str, str]]:
+def get_doc_page_urls(driver, input_path: str, selector: None, interactive: bool = False) -> list[tuple[str, str]]:
     """
     Retrieve documentation page URLs from a navigation element on the base page.
 
@@ -148,48 +550,58 @@ def get_doc_page_urls(driver, input_path: str, selector: None) -> list[tuple[str
     if from_file:
         links = read_links_from_file(input_path, selector)
     else:
-        links = read_links_from_web(driver, input_path, selector)
+        links = read_links_from_web(driver, input_path, selector, interactive)
     
     deduplicated_links = remove_duplicates(links)
     return deduplicated_links
 
 
 def remove_duplicates(links):
-    urls = []
-    urls_set = set()
+    # Dicts keep insertion order, so the first link to each page wins.
+    urls = {}
     for (name, url) in links:
-        url = url.split("#")[0]
-        
-        if url in urls_set:
-            continue
-        urls_set.add(url)
-        urls.append((name, url))
-    return urls
+        url = url.partition("#")[0]
+        if url not in urls:
+            urls[url] = (name, url)
+    return list(urls.values())
 
 
-def read_links_from_web(driver, input_path: str, selector: str = None):
+def read_links_from_web(driver, input_path: str, selector: str = None, interactive: bool = False):
     """Retrieve all links from the navigation element on the base page.
 
     Different websites have different ways of representing navigation elements.
     We try different selectors until one works.
+
+    If interactive, waits for the user to confirm the page is accessible in the
+    (visible) browser first, e.g. after solving a captcha.
     """
     driver.get(input_path)
-    input("Make sure the website content is cleary accesible. Press Enter to continue...")
+    wait_for_load(driver)
+    if interactive:
+        input("Make sure the website content is cleary accesible. Press Enter to continue...")
     expand_collapsible(driver)
     selectors = [".sidebar-primary-item nav a", ".side-nav-section a", "nav a"]
 
-    links = []
-    for selectors in selectors:
-        links_detected = driver.find_elements("css selector", selectors)
-        if links_detected:
-            links = links_detected
-            break
+    # Try the selectors and read the text and target of every link in a single call,
+    # instead of one WebDriver call per selector and two per link. The selectors are
+    # tried in order rather than as one union, as "nav a" would also match the links
+    # the more specific selectors leave out.
+    links_script = """
+    var selectors = arguments[0];
+    for (var i = 0; i < selectors.length; i++) {
+        var links = document.querySelectorAll(selectors[i]);
+        if (links.length > 0) {
+            return Array.from(links).map(function(a) {
+                return [a.textContent.trim(), a.href];
+            });
+        }
+    }
+    return [];
+    """
+    links = driver.execute_script(links_script, selectors) or []
     urls = []
     base_domain = urllib.parse.urlparse(input_path).netloc
-    for link in links:
-        text = link.get_attribute("text") or ""
-        href = link.get_attribute("href")
-
+    for text, href in links:
         if href and text != "" and urllib.parse.urlparse(href).netloc == base_domain:
             urls.append((text, href))
     return urls
@@ -226,23 +638,178 @@ def generate_index_page(urls):
     """
     return index_html
 
+# TrueType fonts covering more than Latin, looked for when the cover or index needs them
+# (regular and bold face).
+UNICODE_FONTS = [
+    ("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf"),
+    ("/usr/share/fonts/TTF/DejaVuSans.ttf", "/usr/share/fonts/TTF/DejaVuSans-Bold.ttf"),
+    ("/usr/share/fonts/dejavu/DejaVuSans.ttf", "/usr/share/fonts/dejavu/DejaVuSans-Bold.ttf"),
+    ("/System/Library/Fonts/Supplemental/Arial Unicode.ttf", None),
+    ("/Library/Fonts/Arial Unicode.ttf", None),
+    (r"C:\Windows\Fonts\arial.ttf", r"C:\Windows\Fonts\arialbd.ttf"),
+]
+
+
+@functools.lru_cache(maxsize=None)
+def get_unicode_font():
+    """Register the first of UNICODE_FONTS found on this system with ReportLab and return it, or None."""
+    for regular, bold in UNICODE_FONTS:
+        if not os.path.isfile(regular):
+            continue
+        if bold is None or not os.path.isfile(bold):
+            bold = regular
+        try:
+            font = TTFont("UnicodeSans", regular)
+            bold_font = TTFont("UnicodeSans-Bold", bold)
+        except TTFError:
+            continue
+        pdfmetrics.registerFont(font)
+        pdfmetrics.registerFont(bold_font)
+        return font
+    return None
+
+
+def reportlab_font_for(text: str):
+    """
+    Return the font to lay out text with in ReportLab, or None if no available font covers it.
+
+    ReportLab's built-in Helvetica only has the Windows-1252 characters. Anything else
+    (Cyrillic, Greek, CJK...) needs a TrueType font with glyphs for all of it, or it is
+    printed as empty boxes.
+    """
+    try:
+        text.encode("cp1252")
+        return "Helvetica"
+    except UnicodeEncodeError:
+        pass
+    font = get_unicode_font()
+    if font is not None and all(ord(char) in font.face.charToGlyph for char in text if not char.isspace()):
+        return font.fontName
+    return None
+
+
+def get_styles(font: str):
+    """ReportLab's sample style sheet, set in the given font family."""
+    styles = getSampleStyleSheet()
+    if font != "Helvetica":
+        for style in styles.byName.values():
+            if isinstance(style, ParagraphStyle):
+                style.fontName = f"{font}-Bold" if "Bold" in style.fontName else font
+    return styles
+
+
+def build_cover_pdf(title: str) -> bytes:
+    """Lay out the cover page with ReportLab, for titles reportlab_font_for finds a font for."""
+    styles = get_styles(reportlab_font_for(title) or "Helvetica")
+    centered = ParagraphStyle("Centered", parent=styles["BodyText"], alignment=TA_CENTER)
+    current_date = datetime.now().strftime("%Y-%m-%d")
+    story = [
+        Spacer(1, 5 * cm),
+        Paragraph(escape(title), styles["Title"]),
+        Paragraph("Documentation PDF", centered),
+        Paragraph(f"Date: {current_date}", centered),
+    ]
+    buffer = BytesIO()
+    SimpleDocTemplate(buffer, pagesize=A4, title=title).build(story)
+    return buffer.getvalue()
+
+
+def index_text(urls) -> str:
+    return "\n".join(f"{name} - {url}" for name, url in urls)
+
+
+def build_index_pdf(urls) -> bytes:
+    """Lay out the table of contents with ReportLab, for entries reportlab_font_for finds a font for."""
+    styles = get_styles(reportlab_font_for(index_text(urls)) or "Helvetica")
+    entries = ListFlowable(
+        [ListItem(Paragraph(f"{escape(name)} - {escape(url)}", styles["BodyText"])) for name, url in urls],
+        bulletType="bullet",
+    )
+    story = [Paragraph("Table of contents", styles["Heading2"]), entries]
+    buffer = BytesIO()
+    SimpleDocTemplate(buffer, pagesize=A4, title="Index").build(story)
+    return buffer.getvalue()
+
+
+def print_options_to_cdp(print_options: PrintOptions) -> dict:
+    """Translate Selenium print options (in centimeters) to DevTools Page.printToPDF parameters (in inches)."""
+    options = print_options.to_dict()
+    page = options.get("page", {})
+    margin = options.get("margin", {})
+    params = {
+        "landscape": options.get("orientation") == "landscape",
+        "printBackground": options.get("background", False),
+        "scale": options.get("scale", 1.0),
+        "paperWidth": page.get("width", 21.59) / 2.54,
+        "paperHeight": page.get("height", 27.94) / 2.54,
+        "marginTop": margin.get("top", 1.0) / 2.54,
+        "marginBottom": margin.get("bottom", 1.0) / 2.54,
+        "marginLeft": margin.get("left", 1.0) / 2.54,
+        "marginRight": margin.get("right", 1.0) / 2.54,
+        # Chromedriver maps shrinkToFit the same way, so both paths lay pages out alike.
+        "preferCSSPageSize": not options.get("shrinkToFit", True),
+    }
+    if options.get("pageRanges"):
+        params["pageRanges"] = ",".join(str(page_range) for page_range in options["pageRanges"])
+    return params
+
+
 def print_pdf_page(driver, pdf_params) -> bytes:
     """
-    Use Selenium’s print_page method to export the currently loaded page to PDF.
-    This method returns PDF bytes.
-    Note: This requires a Selenium version (and browser driver) that supports print_page.
+    Export the currently loaded page to PDF and return the PDF bytes.
+
+    Chromium based drivers print through the DevTools protocol, reading the PDF back
+    as a stream in chunks rather than as one large base64 string. Other drivers use
+    Selenium's print_page method, which requires a Selenium version (and browser driver)
+    that supports it.
     """
-    pdf_base64 = driver.print_page(pdf_params)
-    pdf_bytes = base64.b64decode(pdf_base64)
-    return pdf_bytes
+    if not hasattr(driver, "execute_cdp_cmd"):
+        pdf_base64 = driver.print_page(pdf_params)
+        pdf_bytes = base64.b64decode(pdf_base64)
+        return pdf_bytes
+
+    params = print_options_to_cdp(pdf_params)
+    params["transferMode"] = "ReturnAsStream"
+    stream = driver.execute_cdp_cmd("Page.printToPDF", params)["stream"]
+    pdf_bytes = bytearray()
+    try:
+        while True:
+            chunk = driver.execute_cdp_cmd("IO.read", {"handle": stream, "size": 1024 * 1024})
+            if chunk.get("base64Encoded"):
+                pdf_bytes += base64.b64decode(chunk["data"])
+            else:
+                pdf_bytes += chunk["data"].encode("utf-8")
+            if chunk["eof"]:
+                break
+    finally:
+        driver.execute_cdp_cmd("IO.close", {"handle": stream})
+    return bytes(pdf_bytes)
+
 
 def print_html_to_pdf(driver, html, print_options):
     """
-    Load an HTML string via a data URL and export it to PDF.
+    Render an HTML string and export it to PDF.
+
+    Chromium based drivers write the document straight into a blank tab through the
+    DevTools protocol, which avoids a full navigation. As the generated pages are static,
+    JavaScript is disabled while they are rendered. Other drivers write it into a blank
+    page with document.write.
     """
-    encoded_html = urllib.parse.quote(html)
-    driver.get("data:text/html;charset=utf-8," + encoded_html)
-    time.sleep(1)  # Wait for the page to render.
+    if hasattr(driver, "execute_cdp_cmd"):
+        if driver.current_url != "about:blank":
+            driver.get("about:blank")
+        frame_id = driver.execute_cdp_cmd("Page.getFrameTree", {})["frameTree"]["frame"]["id"]
+        driver.execute_cdp_cmd("Emulation.setScriptExecutionDisabled", {"value": True})
+        try:
+            driver.execute_cdp_cmd("Page.setDocumentContent", {"frameId": frame_id, "html": html})
+            return print_pdf_page(driver, print_options)
+        finally:
+            driver.execute_cdp_cmd("Emulation.setScriptExecutionDisabled", {"value": False})
+
+    # The HTML is passed as a script argument, so it doesn't need to be percent-encoded into a URL.
+    driver.get("about:blank")
+    driver.execute_script("document.open(); document.write(arguments[0]); document.close();", html)
+    wait_for_load(driver)
     return print_pdf_page(driver, print_options)
 
 
@@ -261,74 +828,284 @@ def get_print_options(zoom: float = 0.9):
     return print_options
 
 
-def get_pages_as_pdf(driver, page_urls, print_options):
-    page_urls = page_urls[:]
+def wait_for_load(driver, timeout: float = 10) -> None:
+    """
+    Wait until the current document has loaded and stopped fetching resources.
+
+    First waits for document.readyState to be 'complete', then until the number of
+    resources reported by the Performance API is the same in two consecutive checks,
+    so content requested after the load event (lazy images, late scripts) is in place.
+    Pages that don't settle within the timeout are used as they are.
+    """
+    wait = WebDriverWait(driver, timeout, poll_frequency=0.2)
+    resource_count = None
+
+    def resources_settled(d):
+        nonlocal resource_count
+        count = d.execute_script("return performance.getEntriesByType('resource').length")
+        settled = count == resource_count
+        resource_count = count
+        return settled
+
+    try:
+        wait.until(lambda d: d.execute_script("return document.readyState === 'complete'"))
+        wait.until(resources_settled)
+    except TimeoutException:
+        pass
+
+
+def prepare_page_for_print(driver, next_url: str = None) -> None:
+    """
+    Expand collapsible sections, apply the print styles and, if next_url is given,
+    hint the browser to fetch it in the background, so it's already cached when it's
+    loaded next. This does what expand_collapsible and apply_custom_css do, but takes a
+    single round-trip to the driver.
+    """
+    driver.execute_script(_PREPARE_PAGE_SCRIPT, next_url)
+
+
+def print_url_to_pdf(driver, url, print_options, next_url: str = None) -> bytes:
+    """
+    Load a documentation page, prepare it for printing and export it to PDF.
+
+    If next_url is given, the browser starts fetching it while the current page is printed.
+    """
+    driver.get(url)
+    wait_for_load(driver)
+    prepare_page_for_print(driver, next_url)
+    return print_pdf_page(driver, print_options)
+
+
+def write_temp_pdf(pdf_bytes: bytes, temp_dir: str = None) -> str:
+    """
+    Write a PDF to a temporary file, in temp_dir if given, and return its path.
+    The caller is responsible for removing it.
+    """
+    with tempfile.NamedTemporaryFile(suffix=".pdf", dir=temp_dir, delete=False) as pdf_file:
+        pdf_file.write(pdf_bytes)
+    return pdf_file.name
+
+
+def remove_temp_files(paths) -> None:
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def get_pages_as_pdf(driver, page_urls, print_options) -> list[str]:
+    """
+    Export the documentation pages to PDF, one after the other.
+
+    Each PDF is written to a temporary file as soon as it is printed, so only one page
+    is held in memory at a time. Returns the paths of the files, in the order of page_urls.
+    """
+    urls = [url for name, url in page_urls]
+    next_urls = urls[1:] + [None]
+    pages = list()
+    try:
+        for url, next_url in tqdm(zip(urls, next_urls), total=len(urls), desc="Processing pages", unit="page", dynamic_ncols=True):
+            page_pdf = print_url_to_pdf(driver, url, print_options, next_url)
+            pages.append(write_temp_pdf(page_pdf))
+    except BaseException:
+        remove_temp_files(pages)
+        raise
+    return pages
+
+
+# Per-process state of the pool workers. Each worker process owns its own browser,
+# as WebDriver sessions (and undetected_chromedriver in particular) can't be shared.
+_worker_driver = None
+_worker_print_options = None
+_worker_temp_dir = None
+
+
+def _init_worker(driver_kwargs, print_options, temp_dir, last_slot):
+    global _worker_driver, _worker_print_options, _worker_temp_dir
+    # Slot 0 belongs to the main driver, every worker takes the next free one.
+    with last_slot.get_lock():
+        last_slot.value += 1
+        slot = last_slot.value
+    _worker_driver = setup_driver(**driver_kwargs, slot=slot)
+    _worker_print_options = print_options
+    _worker_temp_dir = temp_dir
+    # Pool processes leave through os._exit, so atexit hooks never run on them.
+    multiprocessing.util.Finalize(None, _worker_driver.quit, exitpriority=10)
+
+
+def _worker_ready() -> None:
+    pass
+
+
+def _print_urls_in_worker(urls, next_urls) -> list[str]:
+    pages = list()
+    for url, next_url in zip(urls, next_urls):
+        page_pdf = print_url_to_pdf(_worker_driver, url, _worker_print_options, next_url)
+        pages.append(write_temp_pdf(page_pdf, _worker_temp_dir))
+    return pages
+
+
+def start_worker_pool(driver_kwargs, print_options, workers: int, temp_dir: str = None) -> ProcessPoolExecutor:
+    """
+    Start a pool of worker processes to print documentation pages with.
+
+    Every worker starts its own browser, so the pages are loaded and printed
+    concurrently. The browsers are started right away in the background, so they
+    can boot while the main process is still busy finding the pages. The workers
+    write their PDFs to temp_dir, if given.
+    """
+    # A shared counter rather than a queue of slots: a Queue starts a feeder thread
+    # in this process before the workers are forked.
+    last_slot = multiprocessing.Value("i", 0)
+    executor = ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(driver_kwargs, print_options, temp_dir, last_slot),
+    )
+    # Worker processes are only spawned as tasks come in, one task per worker starts them all.
+    for _ in range(workers):
+        executor.submit(_worker_ready)
+    return executor
+
+
+def submit_pages(executor: ProcessPoolExecutor, page_urls, workers: int) -> list[Future]:
+    """
+    Queue the documentation pages to be printed by the worker pool.
+
+    Each worker writes its PDFs to temporary files and only the paths travel back.
+    Returns one future per chunk of pages, in the order of page_urls.
+    """
+    urls = [url for name, url in page_urls]
+    next_urls = urls[1:] + [None]
+    # Hand out contiguous runs of pages so every browser gets a fair share of the work,
+    # and usually prints the page it prefetched.
+    chunksize = max(1, len(urls) // (workers * 4))
+    return [
+        executor.submit(_print_urls_in_worker, urls[start:start + chunksize], next_urls[start:start + chunksize])
+        for start in range(0, len(urls), chunksize)
+    ]
+
+
+def collect_pages(page_futures: list[Future], total: int) -> list[str]:
+    """
+    Wait for the pages queued with submit_pages and return the paths of their PDFs, in order.
+
+    If a chunk fails, the pages collected so far are removed and the queued chunks are
+    cancelled. Chunks that are already running still finish, writing to the pool's temp_dir.
+    """
     pages = list()
-    for name, url in tqdm(page_urls, desc="Processing pages", unit="page", dynamic_ncols=True):
-        driver.get(url)
-        time.sleep(1)  # Wait for the page to load.
-        expand_collapsible(driver)
-        apply_custom_css(driver)
-        page_pdf = print_pdf_page(driver, print_options)
-        pages.append(page_pdf)
+    try:
+        with tqdm(total=total, desc="Processing pages", unit="page", dynamic_ncols=True) as progress:
+            for future in page_futures:
+                chunk = future.result()
+                pages.extend(chunk)
+                progress.update(len(chunk))
+    except BaseException:
+        for future in page_futures:
+            future.cancel()
+        remove_temp_files(pages)
+        raise
     return pages
 
 
-def get_index_pdf(driver, page_urls, print_options):
+def get_index_pdf(driver, page_urls, print_options, fancy: bool = False):
+    # Text no font at hand covers is left to the browser, which falls back on the system fonts.
+    if not fancy and reportlab_font_for(index_text(page_urls)) is not None:
+        return build_index_pdf(page_urls)
     index_html = generate_index_page(page_urls)
     index_pdf = print_html_to_pdf(driver, index_html, print_options)
     return index_pdf
 
 
-def merge_pdfs_to(pdf_pages: list[bytes], output_path: str) -> None:
+def merge_pdfs_to(pdf_paths: list[str], output_path: str) -> None:
     """
     Merge the PDF documents by concatenating them.
 
-    This function uses PyPDF2 to append each PDF (from memory) into one final PDF,
-    preserving the original layout and formatting.
+    This function uses pikepdf (qpdf) to append the pages of each PDF file into one
+    final PDF, preserving the original layout and formatting.
     """
 
-    merger = PdfMerger()
-    for pdf_data in tqdm(pdf_pages, desc="Merging pages", unit="page", dynamic_ncols=True):
-        merger.append(BytesIO(pdf_data))
+    sources = []
+    try:
+        with pikepdf.Pdf.new() as merged:
+            for pdf_path in tqdm(pdf_paths, desc="Merging pages", unit="page", dynamic_ncols=True):
+                # The source files have to stay open until the merged PDF is saved.
+                source = pikepdf.Pdf.open(pdf_path)
+                sources.append(source)
+                merged.pages.extend(source.pages)
 
-    if os.path.exists(output_path):
-        os.remove(output_path)
+            if os.path.exists(output_path):
+                os.remove(output_path)
 
-    with open(output_path, "wb") as out_file:
-        merger.write(out_file)
-    merger.close()
+            merged.save(output_path)
+    finally:
+        for source in sources:
+            source.close()
 
 
 def main():
     args = configure_cli()
 
     print("Step 1 of 3: Analyzing website...")
-    driver = setup_driver(args.browser)
-    page_urls = get_doc_page_urls(driver, args.input, args.selector)
-    print(f"Found {len(page_urls)} pages.")
-    
+    driver_kwargs = {
+        "browser": args.browser,
+        "allow_images": args.allow_images,
+        "keep_browser": args.keep_browser,
+        "idle_timeout": args.idle_timeout * 60,
+        "stealth": args.stealth,
+    }
+    if args.stealth and args.browser == "chrome" and not args.keep_browser:
+        # Patch chromedriver before any browser starts, instead of every browser patching
+        # it on its own while the others are already using it.
+        driver_kwargs["driver_executable_path"] = patch_undetected_chromedriver()
     print_options = get_print_options(args.zoom)
-    
-    pdf_pages = [
-        get_cover_pdf(driver, print_options, args.title),
-        get_index_pdf(driver, page_urls, print_options)
-    ]
+    executor = None
+    if args.workers > 1:
+        # The workers write their pages to a directory of their own, so the pages of chunks
+        # that were still running when the run failed are removed along with it.
+        temp_dir = tempfile.mkdtemp(prefix="webdocstopdf-")
+        # The worker browsers start up while the pages are being found.
+        executor = start_worker_pool(driver_kwargs, print_options, args.workers, temp_dir)
 
-    print("Step 2 of 3: Generating PDFs...")
-    pdf_pages.extend(get_pages_as_pdf(driver, page_urls, print_options))
-    
-    driver.quit()
+    driver = None
+    pdf_pages = []
+    try:
+        driver = setup_driver(**driver_kwargs)
+        page_urls = get_doc_page_urls(driver, args.input, args.selector, interactive=args.stealth)
+        print(f"Found {len(page_urls)} pages.")
+
+        print("Step 2 of 3: Generating PDFs...")
+        if executor is not None:
+            page_futures = submit_pages(executor, page_urls, args.workers)
 
-    output_pdf_path = os.path.abspath(args.output)
+        # The cover and index are made while the workers print the pages.
+        pdf_pages.append(write_temp_pdf(get_cover_pdf(driver, print_options, args.title, args.fancy_index)))
+        pdf_pages.append(write_temp_pdf(get_index_pdf(driver, page_urls, print_options, args.fancy_index)))
 
-    print("Step 3 of 3: Merging documents...")
-    merge_pdfs_to(pdf_pages, output_pdf_path)
+        if executor is not None:
+            pdf_pages.extend(collect_pages(page_futures, len(page_urls)))
+        else:
+            pdf_pages.extend(get_pages_as_pdf(driver, page_urls, print_options))
+
+        output_pdf_path = os.path.abspath(args.output)
+
+        print("Step 3 of 3: Merging documents...")
+        merge_pdfs_to(pdf_pages, output_pdf_path)
+    finally:
+        # The browsers are shut down also when the export fails.
+        if driver is not None:
+            driver.quit()
+        if executor is not None:
+            # Queued chunks are cancelled, the ones already running are waited for.
+            executor.shutdown(cancel_futures=True)
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        remove_temp_files(pdf_pages)
     print(f"Merged PDF saved to {output_pdf_path}")
     print("DONE")
 
 
-def get_cover_pdf(driver, print_options, title: str = ""):
+def get_cover_pdf(driver, print_options, title: str = "", fancy: bool = False):
     if title == "":
         # Try to guess from the website meta
         selectors = ['meta[property="og:site_name"]', 'meta[property="og:title']
@@ -343,6 +1120,8 @@ def get_cover_pdf(driver, print_options, title: str = ""):
     if title == "":
         title = "Documentation"
 
+    if not fancy and reportlab_font_for(title) is not None:
+        return build_cover_pdf(title)
     cover_html = generate_cover_page(title)
     cover_pdf = print_html_to_pdf(driver, cover_html, print_options)
     return cover_pdf
@@ -391,6 +1170,45 @@ def configure_cli() -> argparse.Namespace:
         type=float,
     )
 
+    parser.add_argument(
+        "--fancy-index",
+        help="Render the cover and index pages in the browser instead of generating them directly.",
+        action="store_true",
+    )
+
+    parser.add_argument(
+        "--allow-images",
+        help="Load images on the documentation pages. By default they are blocked to speed up printing.",
+        action="store_true",
+    )
+
+    parser.add_argument(
+        "--stealth",
+        help="Use a visible, undetectable Chrome for sites that block automated browsers. "
+             "The tool waits for confirmation before reading the links, e.g. to solve a captcha.",
+        action="store_true",
+    )
+
+    parser.add_argument(
+        "--keep-browser",
+        help="Keep Chrome running after the export and reuse it in the next runs, saving its start-up time.",
+        action="store_true",
+    )
+
+    parser.add_argument(
+        "--idle-timeout",
+        help="Minutes a browser kept with --keep-browser stays open without being used. Defaults to 10.",
+        default=10,
+        type=float,
+    )
+
+    parser.add_argument(
+        "--workers", "-w",
+        help="Number of browsers printing pages in parallel. Defaults to 1.",
+        default=1,
+        type=int,
+    )
+
     return parser.parse_args()
 
 
@@ -1,93 +1,238 @@
 import base64
 import datetime
+import importlib
+import json
+import multiprocessing
+import multiprocessing.util
 import os
+import sys
+import threading
 import time
+import types
+import uuid
+from concurrent.futures import Future
 from io import BytesIO
 
+import pikepdf
 import pytest
+import websocket
 
 # Import the functions to be tested.
 from webdocstopdf.main import (
     setup_driver,
+    block_resources,
+    lock_profile,
+    extend_kept_browser_lease,
+    read_kept_browser_lease,
+    close_kept_browser,
+    shutdown_idle_browser,
+    attach_kept_browser,
+    KeptChrome,
+    find_chrome_executable,
     apply_custom_css,
     expand_collapsible,
     get_doc_page_urls,
+    read_links_from_file,
+    remove_duplicates,
     read_links_from_web,
     generate_cover_page,
     generate_index_page,
+    build_cover_pdf,
+    build_index_pdf,
+    reportlab_font_for,
+    get_unicode_font,
     print_pdf_page,
     print_html_to_pdf,
+    print_url_to_pdf,
+    wait_for_load,
     get_print_options,
+    print_options_to_cdp,
+    write_temp_pdf,
     get_pages_as_pdf,
-    get_index_pdf,
+    start_worker_pool,
+    submit_pages,
+    collect_pages,
     merge_pdfs_to,
     get_cover_pdf,
     configure_cli,
     main,
 )
 
+# The package re-exports the main() function under the name of its module,
+# so the module object is looked up explicitly for patching.
+main_module = importlib.import_module("webdocstopdf.main")
 
-# Dummy classes for simulating Selenium driver and elements.
-class DummyDriver:
-    def __init__(self):
-        self.executed_scripts = []
-        self.visited_urls = []
-        self._print_page_return = None
-        self.find_elements_return = []
-        self.find_element_return = None
-        self.raise_exception_in_find = False
-
-    def execute_script(self, script):
-        self.executed_scripts.append(script)
-
-    def get(self, url):
-        self.visited_urls.append(url)
-
-    def print_page(self, pdf_params):
-        # Return a base64 encoded dummy PDF content.
-        if self._print_page_return is not None:
-            return self._print_page_return
-        return base64.b64encode(b"dummy_pdf").decode("utf-8")
+BASE_URL = "http://example.com"
+URL1 = "http://example.com/page1"
+URL2 = "http://example.com/page2"
+URL3 = "http://example.com/page3"
 
-    def find_elements(self, by, selector):
-        return self.find_elements_return
-
-    def find_element(self, by, selector):
-        if self.raise_exception_in_find:
-            raise Exception("Not found")
-        return self.find_element_return
+# Base64 encoded PDFs, as returned by the WebDriver print command.
+ENCODED_HTML_PDF = base64.b64encode(b"dummy_pdf_html").decode("utf-8")
+ENCODED_URL_PDF = base64.b64encode(b"url_pdf").decode("utf-8")
 
 
+# Dummy element for simulating Selenium elements.
 class DummyElement:
+    __test__ = False
+
     def __init__(self, text, href):
         self.text = text
-        self._href = href
+        self._attrs = {"href": href, "content": text}
 
     def get_attribute(self, attr):
-        if attr == "href":
-            return self._href
-        if attr == "content":
-            return self.text
-        return None
+        return self._attrs.get(attr)
+
+
+# Executor running every call right away, in this process.
+class FakeExecutor:
+    __test__ = False
+
+    def __init__(self):
+        self.submitted = []
+        self.shut_down = False
+
+    def submit(self, fn, *args):
+        self.submitted.append(args)
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def shutdown(self, cancel_futures=False):
+        self.shut_down = True
+
+
+class FakeDatetime(datetime.datetime):
+    __test__ = False
+
+    @classmethod
+    def now(cls, tz=None):
+        return cls(2024, 1, 1)
+
+
+def make_pdf(path, pages):
+    with pikepdf.Pdf.new() as pdf:
+        for _ in range(pages):
+            pdf.add_blank_page()
+        pdf.save(path)
 
 
 # --- Tests for pure functions ---
 
-def test_generate_cover_page_content():
+def test_generate_cover_page_content(monkeypatch):
+    # Freeze the clock so the test cannot straddle midnight.
+    monkeypatch.setattr(main_module, "datetime", FakeDatetime)
     title = "Test Title"
     html = generate_cover_page(title)
     # Check that the title appears in the generated HTML
     assert title in html
     # Check that the current date (formatted as YYYY-MM-DD) is in the HTML
-    current_date = datetime.datetime.now().strftime("%Y-%m-%d")
-    assert current_date in html
+    assert "2024-01-01" in html
 
 
 def test_generate_index_page_content():
-    urls = ["http://example.com/page1", "http://example.com/page2"]
+    urls = [("Page1", URL1), ("Page2", URL2)]
     html = generate_index_page(urls)
-    for url in urls:
-        assert f"<li>{url}</li>" in html
+    for title, url in urls:
+        assert f"<li>{title} - {url}</li>" in html
+
+
+def test_remove_duplicates():
+    links = [
+        ("Page1", URL1),
+        ("Section", "http://example.com/page1#section"),
+        ("Page2", "http://example.com/page2#top"),
+        ("Page2 again", URL2),
+    ]
+    # Anchors are dropped and the first link to each page is kept.
+    assert remove_duplicates(links) == [
+        ("Page1", URL1),
+        ("Page2", URL2),
+    ]
+
+
+def test_build_cover_pdf():
+    pdf_bytes = build_cover_pdf("Test & Title")
+    with pikepdf.Pdf.open(BytesIO(pdf_bytes)) as pdf:
+        assert len(pdf.pages) == 1
+        assert pdf.docinfo["/Title"] == "Test & Title"
+
+
+def page_text_lines(page) -> list[str]:
+    """Return the lines of text shown on a PDF page, however the text runs are split up."""
+    lines = [""]
+    for operands, operator in pikepdf.parse_content_stream(page):
+        operator = str(operator)
+        if operator in ("ET", "T*", "Td", "TD", "'", '"'):
+            lines.append("")
+        if operator in ("Tj", "'", '"'):
+            lines[-1] += bytes(operands[-1]).decode("latin-1")
+        elif operator == "TJ":
+            lines[-1] += "".join(bytes(item).decode("latin-1") for item in operands[0] if isinstance(item, pikepdf.String))
+    return [line for line in lines if line]
+
+
+def test_build_index_pdf():
+    urls = [("Page<1>", URL1), ("Page2", URL2)]
+    pdf_bytes = build_index_pdf(urls)
+    with pikepdf.Pdf.open(BytesIO(pdf_bytes)) as pdf:
+        lines = page_text_lines(pdf.pages[0])
+    assert "Page2 - http://example.com/page2" in lines
+    # Names are escaped, so they are printed as they are rather than read as markup.
+    assert "Page<1> - http://example.com/page1" in lines
+
+
+@pytest.mark.skipif(get_unicode_font() is None, reason="no Unicode TrueType font on this system")
+def test_build_cover_pdf_non_latin_title():
+    pdf_bytes = build_cover_pdf("Документация")
+    with pikepdf.Pdf.open(BytesIO(pdf_bytes)) as pdf:
+        fonts = [str(font.BaseFont) for font in pdf.pages[0].Resources.Font.values()]
+    # The text is set in embedded TrueType subsets; the plain Helvetica left over is only the canvas default.
+    assert any("+" in font for font in fonts)
+    assert "/Helvetica-Bold" not in fonts
+
+
+FAKE_CYRILLIC_FONT = types.SimpleNamespace(
+    fontName="UnicodeSans", face=types.SimpleNamespace(charToGlyph={ord(char): 1 for char in "Документация"})
+)
+
+
+@pytest.mark.parametrize("text, unicode_font, expected", [
+    ("Café – “docs”", None, "Helvetica"),
+    ("Документация", FAKE_CYRILLIC_FONT, "UnicodeSans"),
+    ("Документация", None, None),
+    ("文档", FAKE_CYRILLIC_FONT, None),
+])
+def test_reportlab_font_for(monkeypatch, text, unicode_font, expected):
+    monkeypatch.setattr(main_module, "get_unicode_font", lambda: unicode_font)
+    assert reportlab_font_for(text) == expected
+
+
+@pytest.mark.parametrize("fn_name, args", [
+    ("get_cover_pdf", {"title": "文档"}),
+    ("get_index_pdf", {"page_urls": [("文档", URL1)]}),
+])
+def test_uncovered_text_is_rendered_in_browser(monkeypatch, dummy_driver, fn_name, args):
+    monkeypatch.setattr(main_module, "reportlab_font_for", lambda text: None)
+    monkeypatch.setattr(main_module, "print_html_to_pdf", lambda d, html, opts: b"browser_pdf")
+    assert getattr(main_module, fn_name)(dummy_driver, print_options={}, **args) == b"browser_pdf"
+
+
+@pytest.mark.parametrize("selector, expected", [
+    (None, ["http://example.com/a1", "http://example.com/a2", "http://example.com/b1"]),
+    ("a*", ["http://example.com/a1", "http://example.com/a2"]),
+])
+def test_read_links_from_file(tmp_path, selector, expected):
+    links_file = tmp_path / "links.yaml"
+    links_file.write_text(
+        "alpha:\n  - http://example.com/a1\n  - http://example.com/a2\n"
+        "beta:\n  - http://example.com/b1\n"
+    )
+    links = read_links_from_file(str(links_file), selector)
+    assert links == [("", url) for url in expected]
 
 
 def test_get_print_options():
@@ -100,209 +245,664 @@ def test_get_print_options():
     assert opts.margin_top == 0.5
 
 
+@pytest.mark.parametrize("shrink_to_fit, prefer_css_page_size", [
+    (None, False),
+    (True, False),
+    (False, True),
+])
+def test_print_options_to_cdp(shrink_to_fit, prefer_css_page_size):
+    opts = get_print_options()
+    if shrink_to_fit is not None:
+        opts.shrink_to_fit = shrink_to_fit
+    params = print_options_to_cdp(opts)
+    assert params["preferCSSPageSize"] is prefer_css_page_size
+    assert params["scale"] == 0.9
+    assert params["marginTop"] == pytest.approx(0.5 / 2.54)
+
+
 # --- Tests for functions that interact with a driver ---
 
 
-def test_apply_custom_css():
-    driver = DummyDriver()
-    apply_custom_css(driver)
+def test_lock_profile(monkeypatch, tmp_path):
+    monkeypatch.setattr(main_module, "_profile_locks", [])
+    profile_dir = str(tmp_path / "profile-0")
+    assert lock_profile(profile_dir)
+    # Another run asking for the same profile is turned away until the lock is released.
+    assert not lock_profile(profile_dir)
+    for lock_file in main_module._profile_locks:
+        lock_file.close()
+    assert lock_profile(profile_dir)
+    main_module._profile_locks[-1].close()
+
+
+@pytest.fixture
+def fake_browsers(monkeypatch, dummy_driver, tmp_path):
+    """Record which browser setup_driver starts, and how, instead of starting it."""
+    import selenium_stealth
+    import undetected_chromedriver as uc
+
+    started = []
+
+    def chrome(options):
+        started.append(("chrome", options.arguments, {}))
+        return dummy_driver
+
+    def uc_chrome(options, **kwargs):
+        started.append(("uc", options.arguments, kwargs))
+        return dummy_driver
+
+    def attach_kept_browser(arguments, slot, idle_timeout):
+        started.append(("kept", arguments, {"slot": slot}))
+        return dummy_driver
+
+    stealthed = []
+    monkeypatch.setattr(main_module, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(main_module, "_profile_locks", [])
+    monkeypatch.setattr(main_module.webdriver, "Chrome", chrome)
+    monkeypatch.setattr(uc, "Chrome", uc_chrome)
+    monkeypatch.setattr(main_module, "attach_kept_browser", attach_kept_browser)
+    monkeypatch.setattr(selenium_stealth, "stealth", lambda driver, **kwargs: stealthed.append(driver))
+    monkeypatch.setattr(main_module, "block_resources", lambda driver, allow_images: None)
+    return {"started": started, "stealthed": stealthed, "profile_dir": str(tmp_path / "profile-0")}
+
+
+def test_setup_driver(fake_browsers, dummy_driver):
+    assert setup_driver() is dummy_driver
+    [(kind, arguments, _)] = fake_browsers["started"]
+    assert kind == "chrome"
+    assert "--headless=new" in arguments
+    assert f"--user-data-dir={fake_browsers['profile_dir']}" in arguments
+    assert fake_browsers["stealthed"] == []
+
+
+def test_setup_driver_stealth(fake_browsers, dummy_driver):
+    assert setup_driver(stealth=True, driver_executable_path="/patched/chromedriver") is dummy_driver
+    [(kind, arguments, kwargs)] = fake_browsers["started"]
+    assert kind == "uc"
+    # Sites that block automated browsers also tend to block headless ones.
+    assert "--headless=new" not in arguments
+    assert kwargs == {
+        "user_data_dir": fake_browsers["profile_dir"],
+        "driver_executable_path": "/patched/chromedriver",
+        "user_multi_procs": True,
+    }
+    assert fake_browsers["stealthed"] == [dummy_driver]
+
+
+@pytest.mark.parametrize("stealth, expected_kwargs", [
+    (False, {}),
+    (True, {"user_data_dir": None, "driver_executable_path": None, "user_multi_procs": True}),
+])
+def test_setup_driver_profile_in_use(monkeypatch, fake_browsers, stealth, expected_kwargs):
+    # Another run holds the persistent profile, so the browser gets a throwaway one.
+    monkeypatch.setattr(main_module, "lock_profile", lambda profile_dir: False)
+    setup_driver(stealth=stealth)
+    [(kind, arguments, kwargs)] = fake_browsers["started"]
+    assert not any(argument.startswith("--user-data-dir") for argument in arguments)
+    assert kwargs == expected_kwargs
+
+
+@pytest.mark.parametrize("stealth", [False, True])
+def test_setup_driver_keep_browser(fake_browsers, dummy_driver, stealth):
+    assert setup_driver(keep_browser=True, slot=2, stealth=stealth) is dummy_driver
+    [(kind, arguments, kwargs)] = fake_browsers["started"]
+    assert kind == "kept"
+    assert kwargs == {"slot": 2}
+    assert ("--headless=new" in arguments) is not stealth
+    assert fake_browsers["stealthed"] == ([dummy_driver] if stealth else [])
+
+
+def test_setup_driver_kept_browser_in_use(fake_browsers, tmp_path):
+    # Another run is driving the kept browser, so this one gets a browser of its own.
+    assert lock_profile(str(tmp_path / "browser-0"))
+    setup_driver(keep_browser=True)
+    [(kind, arguments, _)] = fake_browsers["started"]
+    assert kind == "chrome"
+    assert f"--user-data-dir={fake_browsers['profile_dir']}" in arguments
+
+
+def test_find_chrome_executable_missing(monkeypatch):
+    monkeypatch.setattr(main_module.sys, "platform", "linux")
+    monkeypatch.setattr(main_module.shutil, "which", lambda name: None)
+    with pytest.raises(RuntimeError, match="Chrome wasn't found"):
+        find_chrome_executable()
+
+
+@pytest.fixture
+def fake_clock(monkeypatch):
+    """Freeze time.time, and make time.sleep advance it instead of waiting."""
+    clock = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: clock[0])
+    monkeypatch.setattr(time, "sleep", lambda seconds: clock.__setitem__(0, clock[0] + seconds))
+    return clock
+
+
+@pytest.fixture
+def kept_browser(monkeypatch, tmp_path):
+    """A kept browser on slot 0, standing in for the DevTools endpoint of a real one."""
+    browser = {"dir": tmp_path / "browser-0", "port_open": True, "ws_url": "ws://kept", "closed": [], "launched": []}
+    browser["dir"].mkdir()
+    (browser["dir"] / "browser.json").write_text(json.dumps({"arguments": ["--headless=new"], "webSocketDebuggerUrl": "ws://kept"}))
+
+    def close_kept_browser(ws_url):
+        browser["closed"].append(ws_url)
+        browser["port_open"] = False
+
+    def launch_kept_browser(arguments, browser_dir, port):
+        browser["launched"].append(arguments)
+        browser["port_open"] = True
+
+    monkeypatch.setattr(main_module, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(main_module, "is_port_open", lambda port: browser["port_open"])
+    monkeypatch.setattr(main_module, "get_browser_version", lambda port: {"webSocketDebuggerUrl": browser["ws_url"]})
+    monkeypatch.setattr(main_module, "close_kept_browser", close_kept_browser)
+    monkeypatch.setattr(main_module, "launch_kept_browser", launch_kept_browser)
+    return browser
+
+
+def test_extend_kept_browser_lease(tmp_path, fake_clock):
+    extend_kept_browser_lease(str(tmp_path), 600)
+    # A shorter extension never cuts a longer lease short.
+    extend_kept_browser_lease(str(tmp_path), 60)
+    assert read_kept_browser_lease(str(tmp_path)) == 1600
+
+
+def test_extend_kept_browser_lease_replaces_file(monkeypatch, tmp_path, fake_clock):
+    replaced = []
+    replace = os.replace
+    monkeypatch.setattr(main_module.os, "replace", lambda src, dst: replaced.append(dst) or replace(src, dst))
+    extend_kept_browser_lease(str(tmp_path), 60)
+    # The lease is written next to the old one and swapped in, never rewritten in place.
+    assert replaced == [str(tmp_path / "lease")]
+    assert os.listdir(tmp_path) == ["lease"]
+
+
+@pytest.mark.parametrize("lease, ws_url, closed", [
+    (-1, "ws://kept", True),
+    # The lease is renewed while the browser is in use, the shutdown waits for it to expire.
+    (300, "ws://kept", True),
+    # A different browser (or program) has taken the port since, it must be left alone.
+    (-1, "ws://other", False),
+])
+def test_shutdown_idle_browser(kept_browser, fake_clock, lease, ws_url, closed):
+    (kept_browser["dir"] / "lease").write_text(str(fake_clock[0] + lease))
+    kept_browser["ws_url"] = ws_url
+    shutdown_idle_browser(str(kept_browser["dir"]), 9222)
+    assert kept_browser["closed"] == (["ws://kept"] if closed else [])
+    assert fake_clock[0] == 1000 + max(lease, 0)
+
+
+@pytest.mark.parametrize("port_open, arguments, restarted, launched", [
+    (False, ["--headless=new"], False, True),
+    (True, ["--headless=new"], False, False),
+    # A browser started with other options is restarted with the new ones.
+    (True, ["--headless=new", "--blink-settings=imagesEnabled=false"], True, True),
+])
+def test_attach_kept_browser(monkeypatch, dummy_driver, kept_browser, fake_clock, port_open, arguments, restarted, launched):
+    kept_browser["port_open"] = port_open
+    reapers = []
+    monkeypatch.setattr(main_module, "_spawn_reaper", lambda browser_dir, port: reapers.append(port))
+    addresses = []
+    monkeypatch.setattr(main_module, "KeptChrome",
+                        lambda browser_dir, port, idle_timeout, options: addresses.append(options.debugger_address) or dummy_driver)
+    monkeypatch.setattr(main_module.atexit, "register", lambda fn: None)
+    assert attach_kept_browser(arguments, slot=0) is dummy_driver
+    assert addresses == ["127.0.0.1:9222"]
+    assert kept_browser["closed"] == (["ws://kept"] if restarted else [])
+    assert kept_browser["launched"] == ([arguments] if launched else [])
+    # The browser is claimed, and shut down once the claim lapses even if the run crashes.
+    assert read_kept_browser_lease(str(kept_browser["dir"])) == fake_clock[0] + main_module.KEPT_BROWSER_LEASE
+    assert reapers == [9222]
+
+
+def test_attach_kept_browser_refuses_foreign_port(kept_browser):
+    kept_browser["ws_url"] = "ws://other"
+    with pytest.raises(RuntimeError):
+        attach_kept_browser(["--headless=new"], slot=0)
+    assert kept_browser["closed"] == []
+
+
+class FakeWebSocket:
+    __test__ = False
+
+    def __init__(self, closes_early=False):
+        self.closes_early = closes_early
+        self.sent = []
+        self.closed = False
+
+    def send(self, message):
+        self.sent.append(json.loads(message))
+
+    def recv(self):
+        if self.closes_early:
+            raise websocket.WebSocketConnectionClosedException()
+        return json.dumps({"id": 1, "result": {}})
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.mark.parametrize("closes_early", [False, True])
+def test_close_kept_browser(monkeypatch, closes_early):
+    connection = FakeWebSocket(closes_early)
+    handshakes = []
+    monkeypatch.setattr(websocket, "create_connection", lambda url, **kwargs: handshakes.append((url, kwargs)) or connection)
+    close_kept_browser("ws://kept")
+    # Chrome rejects the handshake with a 403 if an Origin header is sent.
+    assert handshakes == [("ws://kept", {"timeout": 5, "suppress_origin": True})]
+    assert connection.sent == [{"id": 1, "method": "Browser.close"}]
+    assert connection.closed
+
+
+def test_close_kept_browser_reports_failed_handshake(monkeypatch):
+    def create_connection(url, **kwargs):
+        raise websocket.WebSocketBadStatusException("Handshake status %d %s", 403, "Forbidden")
+
+    monkeypatch.setattr(websocket, "create_connection", create_connection)
+    with pytest.raises(RuntimeError, match="ws://kept"):
+        close_kept_browser("ws://kept")
+
+
+def test_kept_chrome_quit(monkeypatch, tmp_path, fake_clock):
+    sessions_ended = []
+    monkeypatch.setattr(main_module.webdriver.Chrome, "quit", lambda self: sessions_ended.append(self))
+    # Skip the WebDriver session set up by __init__.
+    driver = KeptChrome.__new__(KeptChrome)
+    driver.browser_dir, driver.port, driver.idle_timeout = str(tmp_path), 9222, 600
+    driver._released = threading.Event()
+    driver.quit()
+    driver.quit()
+    assert sessions_ended == [driver]
+    # Renewing the lease stops, and the browser is kept for the idle timeout.
+    assert driver._released.is_set()
+    assert read_kept_browser_lease(str(tmp_path)) == 1600
+
+
+def test_kept_chrome_renews_lease(monkeypatch, tmp_path, fake_clock):
+    driver = KeptChrome.__new__(KeptChrome)
+    driver.browser_dir = str(tmp_path)
+    renewals = iter([False, False, True])
+    driver._released = type("Released", (), {"wait": lambda self, timeout: next(renewals)})()
+    driver._renew_lease()
+    assert read_kept_browser_lease(str(tmp_path)) == 1000 + main_module.KEPT_BROWSER_LEASE
+
+
+@pytest.mark.parametrize("allow_images", [False, True])
+def test_block_resources(allow_images, dummy_driver):
+    cdp_commands = []
+    dummy_driver.execute_cdp_cmd = lambda cmd, params: cdp_commands.append((cmd, params))
+    block_resources(dummy_driver, allow_images)
+    assert cdp_commands[0] == ("Network.enable", {})
+    command, params = cdp_commands[1]
+    assert command == "Network.setBlockedURLs"
+    assert "*googletagmanager*" in params["urls"]
+    assert ("*.png" in params["urls"]) is not allow_images
+
+
+def test_apply_custom_css(dummy_driver):
+    apply_custom_css(dummy_driver)
     # Verify that the script injected contains expected CSS identifiers.
-    assert any("@media print" in script for script in driver.executed_scripts)
-    assert any("style.innerHTML" in script for script in driver.executed_scripts)
+    assert "@media print" in dummy_driver._all_scripts_joined
+    assert "style.innerHTML" in dummy_driver._all_scripts_joined
 
 
-def test_expand_collapsible():
-    driver = DummyDriver()
-    expand_collapsible(driver)
+def test_expand_collapsible(dummy_driver):
+    expand_collapsible(dummy_driver)
     # Check that a script with "details" and "setAttribute" was executed.
-    assert any("details" in script and "setAttribute" in script for script in driver.executed_scripts)
-
+    assert "details" in dummy_driver._all_scripts_joined
+    assert "setAttribute" in dummy_driver._all_scripts_joined
 
-def test_print_pdf_page():
-    driver = DummyDriver()
-    dummy_pdf = b"dummy_pdf_content"
-    encoded_pdf = base64.b64encode(dummy_pdf).decode("utf-8")
-    driver._print_page_return = encoded_pdf
-    pdf_bytes = print_pdf_page(driver, pdf_params={})
-    assert pdf_bytes == dummy_pdf
 
+def test_print_pdf_page_with_cdp(dummy_driver):
+    chunks = iter([
+        {"data": base64.b64encode(b"dummy_").decode("utf-8"), "base64Encoded": True, "eof": False},
+        {"data": base64.b64encode(b"pdf").decode("utf-8"), "base64Encoded": True, "eof": True},
+    ])
+    cdp_commands = []
+
+    def execute_cdp_cmd(cmd, params):
+        cdp_commands.append((cmd, params))
+        if cmd == "Page.printToPDF":
+            return {"stream": "stream-1"}
+        if cmd == "IO.read":
+            return next(chunks)
+        return {}
+
+    dummy_driver.execute_cdp_cmd = execute_cdp_cmd
+    pdf_bytes = print_pdf_page(dummy_driver, get_print_options())
+    assert pdf_bytes == b"dummy_pdf"
+    command, params = cdp_commands[0]
+    assert command == "Page.printToPDF"
+    assert params["transferMode"] == "ReturnAsStream"
+    assert params["paperWidth"] == pytest.approx(8.27, abs=0.01)
+    assert params["scale"] == 0.9
+    # The stream is released once it has been read.
+    assert cdp_commands[-1] == ("IO.close", {"handle": "stream-1"})
+
+
+def test_print_html_to_pdf(dummy_driver):
+    dummy_driver._print_page_return = ENCODED_HTML_PDF
 
-def test_print_html_to_pdf(monkeypatch):
-    driver = DummyDriver()
-    dummy_pdf = b"dummy_pdf_html"
-    encoded_pdf = base64.b64encode(dummy_pdf).decode("utf-8")
-    driver._print_page_return = encoded_pdf
-
-    # Patch time.sleep to avoid an actual delay.
-    monkeypatch.setattr(time, "sleep", lambda x: None)
+    html = "<html><body>Test</body></html>"
+    pdf_bytes = print_html_to_pdf(dummy_driver, html, print_options={})
+    # Ensure that the HTML was written into a blank page.
+    assert list(dummy_driver.visited_urls) == ["about:blank"]
+    assert (html,) in dummy_driver.script_args
+    assert pdf_bytes == b"dummy_pdf_html"
+
+
+def test_wait_for_load(dummy_driver):
+    resource_counts = iter([3, 5, 5, 5])
+    dummy_driver.execute_script = lambda script, *args: (
+        True if "document.readyState" in script else next(resource_counts)
+    )
+    wait_for_load(dummy_driver)
+    # The wait ends as soon as two consecutive checks report the same resources.
+    assert next(resource_counts) == 5
+
+
+def test_print_url_to_pdf(dummy_driver):
+    dummy_driver._print_page_return = ENCODED_URL_PDF
+    pdf_bytes = print_url_to_pdf(dummy_driver, URL1, print_options={})
+    assert list(dummy_driver.visited_urls) == [URL1]
+    # The page is prepared for printing in a single call once it has finished loading.
+    assert "document.readyState" in dummy_driver._all_scripts_joined
+    assert sum("@media print" in script and "details" in script for script in dummy_driver.executed_scripts) == 1
+    assert pdf_bytes == b"url_pdf"
+
+
+def test_print_html_to_pdf_with_cdp(monkeypatch, dummy_driver):
+    dummy_driver.current_url = URL1
+    cdp_commands = []
+
+    def execute_cdp_cmd(cmd, params):
+        cdp_commands.append((cmd, params))
+        if cmd == "Page.getFrameTree":
+            return {"frameTree": {"frame": {"id": "frame-1"}}}
+        return {}
+
+    dummy_driver.execute_cdp_cmd = execute_cdp_cmd
+    # The CDP printing itself is covered by test_print_pdf_page_with_cdp.
+    monkeypatch.setattr(main_module, "print_pdf_page", lambda d, opts: b"dummy_pdf_html")
 
     html = "<html><body>Test</body></html>"
-    pdf_bytes = print_html_to_pdf(driver, html, print_options={})
-    # Ensure that the driver was called with a data URL.
-    assert any("data:text/html" in url for url in driver.visited_urls)
-    assert pdf_bytes == dummy_pdf
-
-
-def test_get_index_links():
-    driver = DummyDriver()
-    # Create dummy link elements.
-    link1 = DummyElement("Link1", "http://example.com/1")
-    link2 = DummyElement("Link2", "http://example.com/2")
-    driver.find_elements_return = [link1, link2]
-    links = read_links_from_web(driver)
-    assert links == [link1, link2]
-
-
-def test_get_doc_page_urls(monkeypatch):
-    driver = DummyDriver()
-    # Prepare dummy links, including a duplicate.
-    dummy_links = [
-        DummyElement("Page1", "http://example.com/page1"),
-        DummyElement("Page1", "http://example.com/page1"),  # duplicate
-        DummyElement("Page2", "http://example.com/page2"),
-    ]
-    # Monkeypatch get_index_links so it returns our dummy links.
-    monkeypatch.setattr("webdocstopdf.get_index_links", lambda d: dummy_links)
-    monkeypatch.setattr(time, "sleep", lambda x: None)
-    urls = get_doc_page_urls(driver, "http://example.com")
-    # Expect deduplication to leave only two unique entries.
-    expected = [("Page1", "http://example.com/page1"), ("Page2", "http://example.com/page2")]
-    assert urls == expected
-
-
-def test_get_pages_as_pdf(monkeypatch):
-    driver = DummyDriver()
-    # Provide more than 2 pages; the function should only process the first 2.
-    page_urls = [
-        ("Page1", "http://example.com/page1"),
-        ("Page2", "http://example.com/page2"),
-        ("Page3", "http://example.com/page3"),
+    pdf_bytes = print_html_to_pdf(dummy_driver, html, print_options={})
+    # The HTML is injected into a blank tab instead of being loaded from a data URL.
+    assert list(dummy_driver.visited_urls) == ["about:blank"]
+    assert ("Page.setDocumentContent", {"frameId": "frame-1", "html": html}) in cdp_commands
+    # Scripts are disabled for the static page and enabled again afterwards.
+    script_toggles = [params["value"] for cmd, params in cdp_commands if cmd == "Emulation.setScriptExecutionDisabled"]
+    assert script_toggles == [True, False]
+    assert pdf_bytes == b"dummy_pdf_html"
+
+
+def test_read_links_from_web(dummy_driver):
+    # The browser returns the text and target of every navigation link at once.
+    dummy_driver.execute_script_return = [
+        ["Link1", "http://example.com/1"],
+        ["", "http://example.com/untitled"],
+        ["External", "http://other.com/1"],
+        ["Link2", "http://example.com/2"],
     ]
-    dummy_pdf = b"page_pdf"
-    encoded_pdf = base64.b64encode(dummy_pdf).decode("utf-8")
-    driver._print_page_return = encoded_pdf
-    monkeypatch.setattr(time, "sleep", lambda x: None)
-    pages = get_pages_as_pdf(driver, page_urls, print_options={})
-    assert len(pages) == 2
-    assert all(page == dummy_pdf for page in pages)
-
-
-def test_get_index_pdf(monkeypatch):
-    driver = DummyDriver()
-    dummy_pdf = b"index_pdf"
-    encoded_pdf = base64.b64encode(dummy_pdf).decode("utf-8")
-    driver._print_page_return = encoded_pdf
-    monkeypatch.setattr(time, "sleep", lambda x: None)
-    index_pdf = get_index_pdf(driver, ["http://example.com/page1", "http://example.com/page2"], print_options={})
-    assert index_pdf == dummy_pdf
+    links = read_links_from_web(dummy_driver, BASE_URL)
+    assert links == [("Link1", "http://example.com/1"), ("Link2", "http://example.com/2")]
+
+
+@pytest.mark.parametrize("n, dups", [(3, 1), (1000, 500)])
+def test_get_doc_page_urls(monkeypatch, dummy_driver, n, dups):
+    unique = n - dups
+    links = [(f"Page{i % unique}", f"{BASE_URL}/{i % unique}") for i in range(n)]
+    monkeypatch.setattr(main_module, "read_links_from_web", lambda d, url, selector, interactive: links)
+    urls = get_doc_page_urls(dummy_driver, BASE_URL, None)
+    # Deduplication keeps the first occurrence of every page, in order.
+    assert urls == links[:unique]
+
+
+PAGE_URLS = [
+    ("Page1", URL1),
+    ("Page2", URL2),
+    ("Page3", URL3),
+]
+
+
+@pytest.mark.parametrize("fn_name, call_args", [
+    ("print_pdf_page", {"pdf_params": {}}),
+    ("get_index_pdf", {"page_urls": PAGE_URLS[:2], "print_options": {}, "fancy": True}),
+])
+def test_pdf_generation(dummy_driver, encoded_dummy_pdf, fn_name, call_args):
+    dummy_driver._print_page_return = encoded_dummy_pdf
+    assert getattr(main_module, fn_name)(dummy_driver, **call_args) == b"dummy_pdf"
+
+
+def test_get_pages_as_pdf(dummy_driver, encoded_dummy_pdf):
+    dummy_driver._print_page_return = encoded_dummy_pdf
+    # Each page is stored in its own temporary file.
+    assert read_pages(get_pages_as_pdf(dummy_driver, PAGE_URLS, print_options={})) == ["dummy_pdf"] * 3
+
+
+def test_get_pages_as_pdf_prefetches_next_page(dummy_driver):
+    for page in get_pages_as_pdf(dummy_driver, PAGE_URLS, print_options={}):
+        os.remove(page)
+    # Every page is prepared in one call, which prefetches the page that follows it.
+    prefetched = [args[0] for script, args in zip(dummy_driver.executed_scripts, dummy_driver.script_args) if "prefetch" in script]
+    assert prefetched == [URL2, URL3, None]
+
+
+# --- Tests for the worker pool ---
+
+
+def url_printing_driver(driver):
+    """Make the dummy driver print the URL it has loaded, so the order of the pages can be checked."""
+    driver.print_page = lambda pdf_params: base64.b64encode(driver.visited_urls[-1].encode()).decode("utf-8")
+    return driver
+
+
+def read_pages(pages):
+    contents = []
+    for page in pages:
+        with open(page, "rb") as f:
+            contents.append(f.read().decode())
+        os.remove(page)
+    return contents
+
+
+def test_init_worker_assigns_slots(monkeypatch, dummy_driver):
+    last_slot = multiprocessing.Value("i", 0)
+    slots = []
+    monkeypatch.setattr(main_module, "setup_driver", lambda slot, **kwargs: slots.append(slot) or dummy_driver)
+    finalizers = []
+    monkeypatch.setattr(multiprocessing.util, "Finalize", lambda obj, callback, **kwargs: finalizers.append(callback))
+    for name in ("_worker_driver", "_worker_print_options", "_worker_temp_dir"):
+        monkeypatch.setattr(main_module, name, None)
+    for _ in range(3):
+        main_module._init_worker({}, {}, "pages", last_slot)
+    # Slot 0 is left to the main driver.
+    assert slots == [1, 2, 3]
+    assert finalizers == [dummy_driver.quit] * 3
+    assert main_module._worker_temp_dir == "pages"
+
+
+@pytest.mark.parametrize("pages, workers, chunk_sizes", [
+    (3, 2, [1, 1, 1]),
+    (40, 2, [5] * 8),
+    (100, 3, [8] * 12 + [4]),
+])
+def test_submit_pages(monkeypatch, dummy_driver, tmp_path, pages, workers, chunk_sizes):
+    monkeypatch.setattr(main_module, "_worker_driver", url_printing_driver(dummy_driver))
+    monkeypatch.setattr(main_module, "_worker_print_options", {})
+    monkeypatch.setattr(main_module, "_worker_temp_dir", str(tmp_path))
+    urls = [f"{BASE_URL}/{i}" for i in range(pages)]
+    executor = FakeExecutor()
+    page_futures = submit_pages(executor, [("", url) for url in urls], workers)
+    assert [len(chunk_urls) for chunk_urls, next_urls in executor.submitted] == chunk_sizes
+    # Every chunk prefetches the page following each of its own, across chunk boundaries too.
+    assert [url for chunk_urls, next_urls in executor.submitted for url in next_urls] == urls[1:] + [None]
+    collected = collect_pages(page_futures, pages)
+    assert all(os.path.dirname(page) == str(tmp_path) for page in collected)
+    assert read_pages(collected) == urls
+
+
+def test_collect_pages_removes_pages_on_failure(output_dir):
+    written = [write_temp_pdf(b"page", str(output_dir)) for _ in range(2)]
+    done, failed, queued = Future(), Future(), Future()
+    done.set_result(written)
+    failed.set_exception(RuntimeError("browser crashed"))
+    with pytest.raises(RuntimeError):
+        collect_pages([done, failed, queued], 4)
+    assert not any(os.path.exists(page) for page in written)
+    assert queued.cancelled()
+
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != "fork", reason="the patched setup_driver only reaches forked workers")
+def test_worker_pool_keeps_page_order(monkeypatch, dummy_driver, tmp_path):
+    monkeypatch.setattr(main_module, "setup_driver", lambda slot, **kwargs: url_printing_driver(dummy_driver))
+    urls = [f"{BASE_URL}/{i}" for i in range(20)]
+    executor = start_worker_pool({}, {}, 3, str(tmp_path))
+    try:
+        pages = collect_pages(submit_pages(executor, [("", url) for url in urls], 3), len(urls))
+    finally:
+        executor.shutdown()
+    assert read_pages(pages) == urls
 
 
 # --- Test for merge_pdfs_to ---
 
-def test_merge_pdfs_to(tmp_path, monkeypatch):
-    # Define a dummy PdfMerger to capture appended PDFs.
-    class DummyPdfMerger:
-        def __init__(self):
-            self.pdfs = []
-
-        def append(self, pdf_file):
-            self.pdfs.append(pdf_file.read())
-
-        def write(self, out_file):
-            out_file.write(b"".join(self.pdfs))
-
-        def close(self):
-            pass
-
-    # Override PdfMerger in the webdocstopdf module with our dummy.
-    monkeypatch.setattr("webdocstopdf.PdfMerger", DummyPdfMerger)
-    pdf1 = b"pdf1"
-    pdf2 = b"pdf2"
-    pdf_pages = [pdf1, pdf2]
-    output_file = tmp_path / "merged.pdf"
-    merge_pdfs_to(pdf_pages, str(output_file))
-    with open(output_file, "rb") as f:
-        content = f.read()
-    assert content == pdf1 + pdf2
+def test_merge_pdfs_to(output_dir):
+    pdf1 = output_dir / f"{uuid.uuid4().hex}.pdf"
+    make_pdf(pdf1, pages=1)
+    pdf2 = output_dir / f"{uuid.uuid4().hex}.pdf"
+    make_pdf(pdf2, pages=2)
+    output_file = output_dir / f"{uuid.uuid4().hex}.pdf"
+    merge_pdfs_to([str(pdf1), str(pdf2)], str(output_file))
+    with pikepdf.Pdf.open(output_file) as merged:
+        assert len(merged.pages) == 3
 
 
 # --- Tests for get_cover_pdf ---
 
 
-def test_get_cover_pdf_with_meta(monkeypatch):
-    driver = DummyDriver()
-    # Simulate a meta tag element with a custom title.
-    custom_title = "Custom Site Name"
-    meta_element = DummyElement(custom_title, None)
-    driver.find_element_return = meta_element
-
-    dummy_pdf = b"cover_pdf_meta"
-    # Patch print_html_to_pdf so it returns our dummy PDF.
-    monkeypatch.setattr("webdocstopdf.print_html_to_pdf", lambda d, html, opts: dummy_pdf)
-    monkeypatch.setattr(time, "sleep", lambda x: None)
-    cover_pdf = get_cover_pdf(driver, print_options={})
-    assert cover_pdf == dummy_pdf
-
-
-def test_get_cover_pdf_without_meta(monkeypatch):
-    driver = DummyDriver()
-    # Force find_element to raise an exception (simulate meta not found).
-    driver.raise_exception_in_find = True
-
-    dummy_pdf = b"cover_pdf_default"
-    monkeypatch.setattr("webdocstopdf.print_html_to_pdf", lambda d, html, opts: dummy_pdf)
-    monkeypatch.setattr(time, "sleep", lambda x: None)
-    cover_pdf = get_cover_pdf(driver, print_options={})
-    # When meta is missing, the default title "Project documentation" should be used.
-    assert cover_pdf == dummy_pdf
+@pytest.mark.parametrize("raise_exc, meta, expected_title", [
+    (False, DummyElement("Custom Site Name", None), "Custom Site Name"),
+    # When meta is missing, the default title should be used.
+    (True, None, "Documentation"),
+], ids=["with_meta", "without_meta"])
+def test_get_cover_pdf(monkeypatch, dummy_driver, raise_exc, meta, expected_title):
+    dummy_driver.raise_exception_in_find = raise_exc
+    dummy_driver.find_element_return = meta
+    rendered = []
+    monkeypatch.setattr(main_module, "print_html_to_pdf", lambda d, html, opts: rendered.append(html) or b"cover_pdf")
+    assert get_cover_pdf(dummy_driver, print_options={}, fancy=True) == b"cover_pdf"
+    assert expected_title in rendered[0]
 
 
 # --- Test for CLI argument parsing ---
 
 
 def test_configure_cli(monkeypatch):
-    test_args = ["main.py", "http://example.com"]
-    monkeypatch.setattr("sys.argv", test_args)
+    test_args = ["main.py", BASE_URL]
+    monkeypatch.setattr(sys, "argv", test_args)
     args = configure_cli()
-    assert args.url == "http://example.com"
+    assert args.input == BASE_URL
 
 
 # --- Integration test for main ---
 
 
-def test_main(monkeypatch, tmp_path, capsys):
-    dummy_driver = DummyDriver()
-    # Override functions used in main to avoid real browser or file operations.
-    monkeypatch.setattr("webdocstopdf.setup_driver", lambda browser="edge": dummy_driver)
-    monkeypatch.setattr("webdocstopdf.get_doc_page_urls", lambda d, url: [
-        ("Page1", "http://example.com/page1"),
-        ("Page2", "http://example.com/page2"),
-    ])
-    dummy_print_options = {}
-    monkeyatch = monkeypatch.setattr
-    monkeyatch("webdocstopdf.get_print_options", lambda: dummy_print_options)
+@pytest.mark.integration
+def test_main(monkeypatch, output_dir, dummy_driver):
     dummy_pdf = b"dummy_pdf"
-    monkeyatch("webdocstopdf.get_cover_pdf", lambda d, opts: dummy_pdf)
-    monkeyatch("webdocstopdf.get_pages_as_pdf", lambda d, pages, opts: [dummy_pdf, dummy_pdf])
-    monkeyatch("webdocstopdf.get_index_pdf", lambda d, pages, opts: dummy_pdf)
-
-    # Override merge_pdfs_to to write a dummy merged file.
-    output_pdf_path = str(tmp_path / "documentation_merged.pdf")
+    output_pdf_path = str(output_dir / f"{uuid.uuid4().hex}.pdf")
+    merged_pages = []
 
     def dummy_merge(pages, path):
+        # Write a dummy merged file.
+        merged_pages.extend(pages)
         with open(path, "wb") as f:
             f.write(b"merged")
-    monkeyatch("webdocstopdf.merge_pdfs_to", dummy_merge)
 
-    # Ensure that quit() does nothing.
-    dummy_driver.quit = lambda: None
+    # Override functions used in main to avoid real browser or file operations.
+    patches = {
+        "setup_driver": lambda **kwargs: dummy_driver,
+        "get_doc_page_urls": lambda d, url, selector, interactive=False: [("Page1", URL1), ("Page2", URL2)],
+        "get_print_options": lambda zoom: {},
+        "get_cover_pdf": lambda d, opts, title, fancy: dummy_pdf,
+        "get_pages_as_pdf": lambda d, pages, opts: [write_temp_pdf(dummy_pdf) for _ in pages],
+        "get_index_pdf": lambda d, pages, opts, fancy: dummy_pdf,
+        "merge_pdfs_to": dummy_merge,
+    }
+    for name, value in patches.items():
+        monkeypatch.setattr(main_module, name, value)
 
     # Set CLI arguments.
-    monkeypatch.setattr("sys.argv", ["main.py", "http://example.com"])
+    monkeypatch.setattr(sys, "argv", ["main.py", BASE_URL, output_pdf_path])
+    # Collect the progress messages instead of capturing stdout.
+    prints = []
+    monkeypatch.setattr(main_module, "print", lambda *a, **k: prints.append(" ".join(map(str, a))), raising=False)
     main()
-    captured = capsys.readouterr().out
-    assert "DONE" in captured
+    assert "DONE" in prints
+    # The cover, the index and both pages are merged, and the temporary files are removed afterwards.
+    assert len(merged_pages) == 4
+    assert not any(os.path.exists(page) for page in merged_pages)
     # Check that the dummy merged file was created and has the expected content.
     with open(output_pdf_path, "rb") as f:
         content = f.read()
     assert content == b"merged"
+
+
+def test_main_quits_driver_on_failure(monkeypatch, output_dir, dummy_driver):
+    quits = []
+    monkeypatch.setattr(dummy_driver, "quit", lambda: quits.append(dummy_driver))
+
+    def get_doc_page_urls(d, url, selector, interactive=False):
+        raise RuntimeError("link discovery failed")
+
+    monkeypatch.setattr(main_module, "setup_driver", lambda **kwargs: dummy_driver)
+    monkeypatch.setattr(main_module, "get_doc_page_urls", get_doc_page_urls)
+    monkeypatch.setattr(main_module, "print", lambda *a, **k: None, raising=False)
+    monkeypatch.setattr(sys, "argv", ["main.py", BASE_URL, str(output_dir / f"{uuid.uuid4().hex}.pdf")])
+    with pytest.raises(RuntimeError, match="link discovery failed"):
+        main()
+    assert quits == [dummy_driver]
+
+
+@pytest.mark.integration
+def test_main_with_workers(monkeypatch, output_dir, dummy_driver):
+    pool = {}
+
+    def fake_start_worker_pool(driver_kwargs, print_options, workers, temp_dir):
+        # The workers' browsers are stood in for by a dummy driver in this process.
+        pool.update(driver_kwargs=driver_kwargs, workers=workers, temp_dir=temp_dir, executor=FakeExecutor())
+        monkeypatch.setattr(main_module, "_worker_driver", url_printing_driver(dummy_driver))
+        monkeypatch.setattr(main_module, "_worker_print_options", print_options)
+        monkeypatch.setattr(main_module, "_worker_temp_dir", temp_dir)
+        return pool["executor"]
+
+    merged = []
+
+    def dummy_merge(pages, path):
+        merged.extend(read_pages(pages[2:]))
+
+    setup_calls = []
+    patches = {
+        "patch_undetected_chromedriver": lambda: "patched-chromedriver",
+        "start_worker_pool": fake_start_worker_pool,
+        "setup_driver": lambda **kwargs: setup_calls.append(kwargs) or dummy_driver,
+        "get_doc_page_urls": lambda d, url, selector, interactive=False: [("Page1", URL1), ("Page2", URL2), ("Page3", URL3)],
+        "get_cover_pdf": lambda d, opts, title, fancy: b"cover",
+        "get_index_pdf": lambda d, pages, opts, fancy: b"index",
+        "merge_pdfs_to": dummy_merge,
+        "print": lambda *a, **k: None,
+    }
+    for name, value in patches.items():
+        monkeypatch.setattr(main_module, name, value, raising=False)
+    monkeypatch.setattr(sys, "argv", ["main.py", BASE_URL, str(output_dir / f"{uuid.uuid4().hex}.pdf"),
+                                      "--workers", "2", "--stealth"])
+    main()
+    assert pool["workers"] == 2
+    # chromedriver is patched once, and every browser is handed the patched binary.
+    assert pool["driver_kwargs"]["driver_executable_path"] == "patched-chromedriver"
+    assert setup_calls[0]["driver_executable_path"] == "patched-chromedriver"
+    assert merged == [URL1, URL2, URL3]
+    # The directory the workers wrote their pages to is removed with the pool.
+    assert pool["executor"].shut_down
+    assert not os.path.exists(pool["temp_dir"])